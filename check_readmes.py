@@ -5,35 +5,58 @@ It checks that all translation READMEs:
 1. Have the same heading hierarchy structure.
 2. Link to all the same content targets (ignoring language/README links).
 3. Order the python lesson links in the exact same sequence.
+
+It also checks that every local link in README.md and its translations points
+to a file or directory that exists, and that its anchor (a heading in a
+markdown file or a line range in a python file) resolves.
 """
 
 import glob
 import os
+import posixpath
 import re
 import sys
+from typing import NamedTuple
+from urllib.parse import unquote
 
+HEADING_PATTERN = re.compile(r"^(#+)\s+(.+)$")
+LINK_PATTERN = re.compile(r"\[([^\]]+)\]\(([^)]+)\)")
+SCHEME_PATTERN = re.compile(r"^[a-z][a-z0-9+.-]*:", re.IGNORECASE)
+LINE_ANCHOR_PATTERN = re.compile(r"^L(\d+)(?:-L(\d+))?$")
 
-def extract_headings(filepath: str) -> list[int]:
-    """Extract heading levels (number of # characters) from file."""
-    with open(filepath, encoding="utf-8") as f:
-        content = f.read()
-    # Find lines starting with #
-    headings = re.findall(r"^(#+)\s+(.+)$", content, re.MULTILINE)
-    return [len(h[0]) for h in headings]
-
-
-def extract_links(filepath: str) -> list[tuple[str, str]]:
-    """Extract markdown link targets (excluding README/translation links)."""
-    with open(filepath, encoding="utf-8") as f:
-        content = f.read()
-    raw_links = re.findall(r"\[([^\]]+)\]\(([^)]+)\)", content)
-    # Ignore any links that refer to README files (which vary by translation)
-    normalized = []
-    for text, target in raw_links:
-        if "README" in target:
-            continue
-        normalized.append((text, target))
-    return normalized
+# Directories that READMEs never link into
+SKIPPED_DIRS = {".git", ".cache", ".runner", ".venv", "venv", "node_modules", "__pycache__", ".mypy_cache", ".ruff_cache", ".pytest_cache"}
+
+
+class Target(NamedTuple):
+    """A file or directory that links may point to."""
+
+    anchors: frozenset[str]
+    lines: int
+
+    def has_anchor(self, anchor: str) -> bool:
+        """Check a heading anchor, or a GitHub line anchor like L10 or L10-L20."""
+        if anchor in self.anchors:
+            return True
+        match = LINE_ANCHOR_PATTERN.match(anchor)
+        return match is not None and all(1 <= int(line) <= self.lines for line in match.groups() if line)
+
+
+def parse_readme(content: str) -> tuple[list[int], list[tuple[str, str]]]:
+    """Extract heading levels and markdown link targets in one pass over the lines."""
+    headings = []
+    links: list[tuple[str, str]] = []
+    for line in content.split("\n"):
+        if line.startswith("#") and (match := HEADING_PATTERN.match(line)):
+            headings.append(len(match[1]))
+        if "](" in line:
+            links.extend(LINK_PATTERN.findall(line))
+    return headings, links
+
+
+def get_content_links(links: list[tuple[str, str]]) -> list[tuple[str, str]]:
+    """Filter out links that refer to README files (which vary by translation)."""
+    return [(text, target) for text, target in links if "README" not in target]
 
 
 def get_lesson_links(links: list[tuple[str, str]]) -> list[str]:
@@ -41,6 +64,168 @@ def get_lesson_links(links: list[tuple[str, str]]) -> list[str]:
     return [target for _, target in links if "ultimatepython/" in target]
 
 
+def diff_sequences(expected: list[str], found: list[str]) -> list[tuple[str, int, int]]:
+    """Compute a minimal edit script from one sequence to another with Myers' algorithm.
+
+    Runs in O((N+D)D) time for sequences of total length N that differ by D edits.
+    Each step is ("=", i, j) when expected[i] matches found[j], ("-", i, j) when
+    expected[i] is missing, or ("+", i, j) when found[j] is unexpected.
+    """
+    n, m = len(expected), len(found)
+    # v maps each diagonal k = x - y to the furthest x reached on it, and trace
+    # keeps v as it was before each round so the path can be walked back
+    v = {1: 0}
+    trace = []
+    for d in range(n + m + 1):
+        trace.append(v.copy())
+        for k in range(-d, d + 1, 2):
+            x = v[k + 1] if k == -d or (k != d and v[k - 1] < v[k + 1]) else v[k - 1] + 1
+            y = x - k
+            while x < n and y < m and expected[x] == found[y]:
+                x, y = x + 1, y + 1
+            v[k] = x
+        # The end is reached once the diagonal through (n, m) gets to x = n
+        if v.get(n - m, -1) >= n:
+            break
+
+    script = []
+    x, y = n, m
+    for d in range(len(trace) - 1, -1, -1):
+        v = trace[d]
+        k = x - y
+        prev_k = k + 1 if k == -d or (k != d and v[k - 1] < v[k + 1]) else k - 1
+        prev_x = v[prev_k]
+        prev_y = prev_x - prev_k
+        while x > prev_x and y > prev_y:
+            x, y = x - 1, y - 1
+            script.append(("=", x, y))
+        if d > 0:
+            script.append(("+", x, y - 1) if x == prev_x else ("-", x - 1, y))
+        x, y = prev_x, prev_y
+    script.reverse()
+    return script
+
+
+def describe_lesson_diff(expected: list[str], found: list[str], name: str) -> list[str]:
+    """Describe the lesson links missing, unexpected or moved relative to the expected order.
+
+    Indices into README.md and into the translation are labeled as such,
+    since a moved link has one of each.
+    """
+    script = diff_sequences(expected, found)
+    # A lesson both deleted and inserted has moved rather than gone missing
+    inserted: dict[str, list[int]] = {}
+    for op, _, j in script:
+        if op == "+":
+            inserted.setdefault(found[j], []).append(j)
+    moved = set()
+    lines = []
+    for op, i, _ in script:
+        if op == "-":
+            if inserted.get(expected[i]):
+                new_index = inserted[expected[i]].pop(0)
+                moved.add(new_index)
+                lines.append(f"    Moved '{expected[i]}' from README.md index {i} to {name} index {new_index}")
+            else:
+                lines.append(f"    Missing '{expected[i]}' at README.md index {i}")
+    for op, _, j in script:
+        if op == "+" and j not in moved:
+            lines.append(f"    Unexpected '{found[j]}' at {name} index {j}")
+    return lines
+
+
+def heading_anchors(content: str) -> frozenset[str]:
+    """Compute the GitHub anchor of every heading outside code blocks in a markdown file."""
+    anchors = set()
+    counts: dict[str, int] = {}
+    fenced = False
+    for line in content.split("\n"):
+        if line.startswith("```"):
+            fenced = not fenced
+        elif not fenced and line.startswith("#") and (match := HEADING_PATTERN.match(line)):
+            slug = re.sub(r"[^\w\- ]", "", match[2].strip().lower()).replace(" ", "-")
+            # Repeated headings get -1, -2, ... appended in order of appearance
+            count = counts.get(slug, 0)
+            counts[slug] = count + 1
+            anchors.add(f"{slug}-{count}" if count else slug)
+    return frozenset(anchors)
+
+
+def build_target_index(root_dir: str) -> dict[str, Target]:
+    """Index every file and directory in the repository by its path relative to the root.
+
+    Markdown files carry their heading anchors and python files their line count,
+    so resolving a link and its anchor is a dictionary lookup.
+    """
+    index = {}
+    for dirpath, dirnames, filenames in os.walk(root_dir):
+        dirnames[:] = [dirname for dirname in dirnames if dirname not in SKIPPED_DIRS]
+        rel_dir = os.path.relpath(dirpath, root_dir).replace(os.sep, "/")
+        index[rel_dir] = Target(frozenset(), 0)
+        for filename in filenames:
+            filepath = os.path.join(dirpath, filename)
+            anchors: frozenset[str] = frozenset()
+            lines = 0
+            if filename.endswith((".md", ".py")):
+                with open(filepath, encoding="utf-8", errors="replace") as f:
+                    content = f.read()
+                lines = len(content.splitlines())
+                if filename.endswith(".md"):
+                    anchors = heading_anchors(content)
+            index[posixpath.join(rel_dir, filename) if rel_dir != "." else filename] = Target(anchors, lines)
+    return index
+
+
+def broken_links(targets: list[str], index: dict[str, Target], readme_path: str) -> list[str]:
+    """Describe every local link target that does not resolve against the index."""
+    broken = []
+    for target in targets:
+        if SCHEME_PATTERN.match(target):
+            continue
+        path, _, anchor = unquote(target).partition("#")
+        # A bare anchor points into the README itself
+        path = posixpath.normpath(posixpath.join(posixpath.dirname(readme_path), path.split("?")[0])) if path else readme_path
+        entry = index.get(path)
+        if entry is None:
+            broken.append(f"{target} (missing file)")
+        elif anchor and not entry.has_anchor(anchor):
+            broken.append(f"{target} (missing anchor)")
+    return list(dict.fromkeys(broken))
+
+
+def check_readme(headings: list[int], links: list[tuple[str, str]], name: str, main_headings: list[int], main_links: list[tuple[str, str]]) -> list[str]:
+    """Check one translation against README.md and return its failures, if any."""
+    links = get_content_links(links)
+    main_links = get_content_links(main_links)
+    main_targets = {target for _, target in main_links}
+    main_lessons = get_lesson_links(main_links)
+    targets = {target for _, target in links}
+    lessons = get_lesson_links(links)
+    report = []
+
+    # 1. Heading structure check
+    if headings != main_headings:
+        report.append(f"FAIL: {name} heading hierarchy does not match README.md")
+        report.append(f"  Expected heading levels: {main_headings}")
+        report.append(f"  Found heading levels:    {headings}")
+
+    # 2. Content link targets check
+    missing_targets = main_targets - targets
+    if missing_targets:
+        report.append(f"FAIL: {name} is missing the following links:")
+        report.extend(f"  - {target}" for target in sorted(missing_targets))
+
+    # 3. Lesson ordering check
+    if lessons != main_lessons:
+        report.append(f"FAIL: {name} lesson links are out of order or mismatched.")
+        # Minimal diff against README.md, so one inserted link is reported once
+        # instead of shifting every later index
+        report.append("  Differences from README.md:")
+        report.extend(describe_lesson_diff(main_lessons, lessons, name))
+
+    return report
+
+
 def main() -> int:
     root_dir = os.path.dirname(os.path.abspath(__file__))
     main_readme = os.path.join(root_dir, "README.md")
@@ -49,54 +234,34 @@ def main() -> int:
         print(f"Error: Main README not found at {main_readme}")
         return 1
 
-    main_headings = extract_headings(main_readme)
-    main_links = extract_links(main_readme)
-    main_targets = {target for _, target in main_links}
-    main_lessons = get_lesson_links(main_links)
+    with open(main_readme, encoding="utf-8") as f:
+        main_headings, main_links = parse_readme(f.read())
 
     other_readmes = sorted(glob.glob(os.path.join(root_dir, "README.*.md")))
-    failed = False
+    index = build_target_index(root_dir)
 
     print(f"Checking {len(other_readmes)} translation files against README.md...")
 
+    failed = False
+    main_broken = broken_links([target for _, target in main_links], index, "README.md")
+    if main_broken:
+        print("FAIL: README.md has broken links:")
+        print("\n".join(f"  - {target}" for target in main_broken))
+        failed = True
+
     for readme in other_readmes:
         name = os.path.basename(readme)
-        headings = extract_headings(readme)
-        links = extract_links(readme)
-        targets = {target for _, target in links}
-        lessons = get_lesson_links(links)
-
-        # 1. Heading structure check
-        if headings != main_headings:
-            print(f"FAIL: {name} heading hierarchy does not match README.md")
-            print(f"  Expected heading levels: {main_headings}")
-            print(f"  Found heading levels:    {headings}")
-            failed = True
-
-        # 2. Content link targets check
-        missing_targets = main_targets - targets
-        if missing_targets:
-            print(f"FAIL: {name} is missing the following links:")
-            for target in sorted(missing_targets):
-                print(f"  - {target}")
-            failed = True
-
-        # 3. Lesson ordering check
-        if lessons != main_lessons:
-            print(f"FAIL: {name} lesson links are out of order or mismatched.")
-            # Simple diff view for lessons
-            print("  Expected sequence:")
-            for i, lesson in enumerate(main_lessons):
-                found = lessons[i] if i < len(lessons) else "<MISSING>"
-                if found != lesson:
-                    print(f"    Index {i}: Expected '{lesson}', got '{found}'")
-            failed = True
-
-        if not failed:
-            print(f"PASS: {name} is consistent.")
+        with open(readme, encoding="utf-8") as f:
+            headings, links = parse_readme(f.read())
+        report = check_readme(headings, links, name, main_headings, main_links)
+        if broken := broken_links([target for _, target in links], index, name):
+            report.append(f"FAIL: {name} has broken links:")
+            report.extend(f"  - {target}" for target in broken)
+        print("\n".join(report) if report else f"PASS: {name} is consistent.")
+        failed = failed or bool(report)
 
     if failed:
-        print("\nVerification failed: translated READMEs are inconsistent.")
+        print("\nVerification failed: READMEs are inconsistent or have broken links.")
         return 1
 
     print("\nAll translation READMEs are consistent!")
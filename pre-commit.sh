@@ -58,5 +58,5 @@ fi
 "$PYTHON_EXEC" -m mypy ultimatepython check_readmes.py runner.py
 
 # Coverage
-"$PYTHON_EXEC" -m coverage run runner.py
+"$PYTHON_EXEC" -m coverage run runner.py --no-cache
 "$PYTHON_EXEC" -m coverage report --fail-under=80
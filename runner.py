@@ -1,8 +1,28 @@
+import hashlib
+import json
+import math
+import os
 import sys
+import time
 import traceback
-from importlib import import_module
+import tracemalloc
+from argparse import ArgumentParser, ArgumentTypeError, Namespace
+from collections.abc import Callable, Iterable, Iterator
+from contextlib import nullcontext
+from dataclasses import asdict, dataclass, field, replace
+from functools import cache
+from importlib import import_module, invalidate_caches
+from importlib.util import resolve_name
 from inspect import isfunction, signature
-from pkgutil import walk_packages
+from types import ModuleType
+from typing import TYPE_CHECKING, TextIO
+
+# Modules that only some modes need are imported where they are used, so
+# that a plain run of a few modules starts quickly
+if TYPE_CHECKING:
+    import pstats
+    from concurrent.futures import Executor, Future
+    from multiprocessing.connection import Connection
 
 from ultimatepython import __name__ as root_name
 from ultimatepython import __path__ as root_path
@@ -14,6 +34,56 @@ _STYLE_BOLD = "\033[1m"
 _STYLE_END = "\033[0m"
 _RUNNER_PROGRESS = "->"
 _RUNNER_MAIN = "main"
+_STATUS_PASS = "PASS"
+_STATUS_FAIL = "FAIL"
+_STATUS_SKIP = "SKIP"
+_STATUS_TIMEOUT = "TIMEOUT"
+_STAT_KEYS = {_STATUS_PASS: "passed", _STATUS_FAIL: "failed", _STATUS_SKIP: "skipped", _STATUS_TIMEOUT: "timed_out"}
+_PHASE_LOAD = "load"
+_PHASE_RUN = "run"
+_REPORT_NAME = "runner-report"
+_REPORT_EXTENSIONS = {"json": "json", "junit": "xml", "ndjson": "ndjson"}
+_SLOWEST_COUNT = 10
+_IMPORT_TIME_PREFIX = "import time:"
+_IMPORT_TOP_COUNT = 5
+_ROOT_DIR = os.path.dirname(root_path[0])
+_STATE_DIR = os.path.join(_ROOT_DIR, ".runner")
+_CACHE_FILE = os.path.join(_STATE_DIR, "cache.json")
+_HISTORY_FILE = os.path.join(_STATE_DIR, "history.json")
+_PROFILE_DIR = os.path.join(_STATE_DIR, "profiles")
+_PROFILE_MERGED = "merged.pstats"
+_PROFILE_COLLAPSED = "collapsed.txt"
+_IMPACT_FILE = os.path.join(_STATE_DIR, "impact.json")
+_TIMEOUT_GRACE = 5.0
+_WATCH_INTERVAL = 0.5
+
+
+@dataclass
+class ModuleResult:
+    """Outcome of loading and running a single module."""
+
+    name: str
+    status: str
+    phase: str = _PHASE_RUN
+    error: str = ""
+    wall_time: float = 0.0
+    cpu_time: float = 0.0
+    peak_memory: int = 0
+    cached: bool = False
+    samples: list[float] = field(default_factory=list)
+    covered: dict[str, list[int]] = field(default_factory=dict)
+
+
+@dataclass(frozen=True)
+class RunOptions:
+    """Settings that every worker needs in order to run a module."""
+
+    bench: int = 0
+    warmup: int = 0
+    trace_memory: bool = True
+    profile_dir: str | None = None
+    record_lines: bool = False
+    raise_import_errors: bool = False
 
 
 def style_text(text: str, color: str = "") -> str:
@@ -21,59 +91,1064 @@ def style_text(text: str, color: str = "") -> str:
     return f"{color}{_STYLE_BOLD}{text}{_STYLE_END}"
 
 
-def main() -> None:
-    # Get filter from command line arguments
-    filter_str = sys.argv[1] if len(sys.argv) > 1 else None
+def parse_shard(value: str) -> tuple[int, int]:
+    """Parse a shard spec like `2/4` into its 1-based index and count."""
+    index, _, count = value.partition("/")
+    if not (index.isdigit() and count.isdigit() and 1 <= int(index) <= int(count)):
+        raise ArgumentTypeError(f"expected i/N with 1 <= i <= N, got {value!r}")
+    return int(index), int(count)
 
-    print(style_text(f"Start {root_name} runner"))
 
-    stats = {"passed": 0, "failed": 0, "skipped": 0}
+def parse_args(argv: list[str]) -> Namespace:
+    """Parse command line arguments."""
+    parser = ArgumentParser(description=f"Run the main() function of every {root_name} module.")
+    parser.add_argument("filter", nargs="?", help="only run modules whose name contains this string")
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="number of worker processes (0 means one per CPU)")
+    parser.add_argument("--report", action="append", default=[], choices=list(_REPORT_EXTENSIONS), help="write a machine-readable report")
+    parser.add_argument("--report-dir", default=".", help="directory for report files (default: current directory)")
+    parser.add_argument(
+        "--backend",
+        choices=["process", "interpreter"],
+        default="process",
+        help="run modules in worker processes or in subinterpreters (default: process)",
+    )
+    parser.add_argument("--timeout", type=float, help="seconds before a module is killed and marked as TIMEOUT")
+    parser.add_argument("--watch", action="store_true", help="keep running and re-run modules affected by source changes")
+    parser.add_argument("--bench", type=int, default=0, metavar="N", help="time N extra calls of each main() after the normal run")
+    parser.add_argument("--bench-warmup", type=int, default=1, metavar="N", help="untimed calls before benchmarking (default: 1)")
+    parser.add_argument("--bench-baseline", metavar="PATH", help="compare benchmark medians against a saved baseline")
+    parser.add_argument("--bench-save", metavar="PATH", help="save benchmark statistics as a baseline")
+    parser.add_argument("--bench-threshold", type=float, default=0.25, help="allowed median slowdown against the baseline (default: 0.25)")
+    parser.add_argument("--shard", type=parse_shard, metavar="i/N", help="only run the i-th of N shards, balanced by --durations if given")
+    parser.add_argument("--durations", metavar="PATH", help="JSON report shared by every shard to take module durations from (default: split by name)")
+    parser.add_argument("--merge", action="append", metavar="PATH", help="merge the JSON report of a shard into one summary (repeat for each shard)")
+    parser.add_argument("--profile", action="store_true", help="run each main() under cProfile and save the stats")
+    parser.add_argument("--profile-dir", default=_PROFILE_DIR, help=f"directory for profile output (default: {os.path.relpath(_PROFILE_DIR)})")
+    parser.add_argument("--record-impact", action="store_true", help="record the source lines each module executes, using coverage")
+    parser.add_argument("--changed-since", metavar="REF", help="only run modules whose recorded lines changed since a git ref")
+    parser.add_argument("--no-cache", action="store_true", help="run every module even if its source has not changed")
+    parser.add_argument("--profile-imports", action="store_true", help="profile the import cost of each module instead of running it")
+    return parser.parse_args(argv)
 
-    for item in walk_packages(root_path, f"{root_name}."):
-        # Skip packages (folders), only run modules (files)
-        if item.ispkg:
-            continue
 
-        # Filter modules based on command line argument
-        if filter_str and filter_str not in item.name:
+def load_state(path: str) -> dict:
+    """Load a JSON file that the runner keeps between runs."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_state(path: str, state: dict) -> None:
+    """Save a JSON file that the runner keeps between runs."""
+    os.makedirs(_STATE_DIR, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2)
+
+
+def discover_modules(filter_str: str | None) -> list[str]:
+    """Get the names of all modules that match the filter, without importing anything."""
+    names = []
+    for dirpath, dirnames, filenames in os.walk(root_path[0]):
+        # Only packages (folders with __init__.py) can hold modules
+        if "__init__.py" not in filenames:
+            dirnames.clear()
             continue
+        for filename in filenames:
+            if filename.endswith(".py") and filename != "__init__.py":
+                name = path_to_module(os.path.join(dirpath, filename))
+                if not filter_str or filter_str in name:
+                    names.append(name)
+    return sorted(names)
+
+
+def module_path(name: str) -> str | None:
+    """Get the source file of a project module without importing it."""
+    base = os.path.join(_ROOT_DIR, *name.split("."))
+    for path in (f"{base}.py", os.path.join(base, "__init__.py")):
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+def path_to_module(path: str) -> str:
+    """Get the module name of a project source file."""
+    parts = os.path.relpath(path, _ROOT_DIR).removesuffix(".py").split(os.sep)
+    if parts[-1] == "__init__":
+        parts.pop()
+    return ".".join(parts)
+
 
+def module_imports(name: str) -> set[str]:
+    """Get the project modules that a module depends on, according to its AST.
+
+    Parent packages count as dependencies too, because importing a module
+    runs the __init__ of every package above it.
+    """
+    import ast
+
+    path = module_path(name)
+    if path is None:
+        return set()
+    with open(path, "rb") as f:
         try:
-            mod = import_module(item.name)
-        except (ImportError, SyntaxError):
-            print(f"{_RUNNER_PROGRESS} Load {item.name}", end="")
-            print(style_text(" [FAIL]", _STYLE_FAILURE))
-            for line in traceback.format_exc().splitlines():
-                print(f"    {line}")
-            stats["failed"] += 1
-            continue
+            tree = ast.parse(f.read(), path)
+        except SyntaxError:
+            return set()
 
-        # Skip modules without a valid main object
-        mod_main = getattr(mod, _RUNNER_MAIN, None)
-        if not isfunction(mod_main) or len(signature(mod_main).parameters) != 0:
-            print(f"{_RUNNER_PROGRESS} Skip {item.name}: No valid {_RUNNER_MAIN}() function")
-            stats["skipped"] += 1
-            continue
+    package = name if path.endswith("__init__.py") else name.rpartition(".")[0]
+    found = {name}
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            found.update(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom):
+            base = resolve_name("." * node.level + (node.module or ""), package) if node.level else node.module or ""
+            found.add(base)
+            found.update(f"{base}.{alias.name}" for alias in node.names)
+
+    deps = set()
+    for dep in found:
+        parts = dep.split(".")
+        for i in range(1, len(parts) + 1):
+            candidate = ".".join(parts[:i])
+            if (candidate == root_name or candidate.startswith(f"{root_name}.")) and module_path(candidate):
+                deps.add(candidate)
+    deps.discard(name)
+    return deps
+
+
+def build_import_graph(names: Iterable[str]) -> dict[str, set[str]]:
+    """Map each module, and everything it reaches, to its direct dependencies."""
+    graph: dict[str, set[str]] = {}
+    pending = list(names)
+    while pending:
+        name = pending.pop()
+        if name not in graph:
+            graph[name] = module_imports(name)
+            pending.extend(graph[name])
+    return graph
+
+
+def dependencies(name: str, graph: dict[str, set[str]]) -> set[str]:
+    """Get a module and all of its transitive dependencies."""
+    seen = set()
+    pending = [name]
+    while pending:
+        current = pending.pop()
+        if current not in seen:
+            seen.add(current)
+            pending.extend(graph.get(current, ()))
+    return seen
+
+
+@cache
+def file_digest(path: str) -> str:
+    """Get the SHA-256 digest of a file."""
+    with open(path, "rb") as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
+
+
+def source_fingerprint(name: str, graph: dict[str, set[str]]) -> str:
+    """Hash the interpreter version with the source of a module and its dependencies."""
+    digest = hashlib.sha256(sys.version.encode())
+    for dep in sorted(dependencies(name, graph)):
+        path = module_path(dep)
+        digest.update(f"{dep}:{file_digest(path) if path else ''}\n".encode())
+    return digest.hexdigest()
+
+
+def schedule(names: list[str], history: dict[str, dict]) -> list[str]:
+    """Order modules so that past failures run first, then the slowest modules.
+
+    Failures show up within the first moments of a run, and starting long
+    modules early keeps parallel workers evenly loaded until the end.
+    Modules without history have an unknown cost, so they go right after
+    the failures.
+    """
+
+    def priority(name: str) -> tuple[bool, float]:
+        entry = history.get(name)
+        if entry is None:
+            return True, -math.inf
+        return not entry["failed"], -entry["duration"]
+
+    return sorted(names, key=priority)
+
+
+def shard_modules(names: list[str], shard: tuple[int, int], durations: dict[str, float]) -> list[str]:
+    """Get the modules of one shard, balancing shards by total duration.
+
+    Modules are handed out longest-first to whichever shard has the least
+    work so far. Ties are broken by name and shard number, so every CI node
+    computes the same split from the same durations. Modules without a
+    recorded duration count as a typical (median) module, so without any
+    durations the modules are dealt out by name.
+    """
+    import statistics
+
+    index, count = shard
+    default = statistics.median(durations.values()) if durations else 1.0
+    loads = [0.0] * count
+    assigned: list[list[str]] = [[] for _ in range(count)]
+    for name in sorted(names, key=lambda name: (-durations.get(name, default), name)):
+        lightest = loads.index(min(loads))
+        loads[lightest] += durations.get(name, default)
+        assigned[lightest].append(name)
+    return sorted(assigned[index - 1])
+
+
+def load_durations(path: str | None) -> dict[str, float]:
+    """Get module durations from a JSON report.
+
+    The local run history is never used, because it differs between
+    machines and every shard run rewrites it, so shards would no longer
+    partition the modules.
+    """
+    if not path:
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return {module["name"]: module["wall_time"] for module in json.load(f)["modules"] if not module["cached"]}
+
+
+def update_history(history: dict[str, dict], results: list[ModuleResult]) -> None:
+    """Record how long each executed module took and whether it failed."""
+    for result in results:
+        if not result.cached and result.status != _STATUS_SKIP:
+            history[result.name] = {"duration": result.wall_time, "failed": result.status != _STATUS_PASS}
+
+
+def uses_profiler(mod: ModuleType) -> bool:
+    """Check whether a module uses cProfile itself.
 
-        # Execution phase
-        print(f"{_RUNNER_PROGRESS} Run {mod.__name__}:{_RUNNER_MAIN}", end="")
+    Only one profiler can be active at a time, so these modules would fail
+    if the runner profiled them too.
+    """
+    profiler = sys.modules.get("cProfile")
+    if profiler is None:
+        return False
+    return any(value is profiler or getattr(value, "__module__", None) == "cProfile" for value in vars(mod).values())
+
+
+def run_module(name: str, options: RunOptions) -> ModuleResult:
+    """Import a module and run its main() function.
+
+    This is the unit of work for every execution mode, so it must stay
+    a top-level function that can be pickled into a worker process.
+    """
+    if options.record_lines:
+        return run_with_coverage(name, replace(options, record_lines=False))
+
+    try:
+        mod = import_module(name)
+    except ImportError:
+        # Let the executor retry modules that only refuse to load in this kind of worker
+        if options.raise_import_errors:
+            raise
+        return ModuleResult(name, _STATUS_FAIL, _PHASE_LOAD, traceback.format_exc())
+    except Exception:
+        return ModuleResult(name, _STATUS_FAIL, _PHASE_LOAD, traceback.format_exc())
+
+    # Skip modules without a valid main object
+    mod_main = getattr(mod, _RUNNER_MAIN, None)
+    if not isfunction(mod_main) or len(signature(mod_main).parameters) != 0:
+        return ModuleResult(name, _STATUS_SKIP, _PHASE_LOAD)
+
+    profile = None
+    if options.profile_dir and not uses_profiler(mod):
+        import cProfile
+
+        profile = cProfile.Profile()
+
+    # Measure the main() call only, so import cost does not skew the numbers
+    if options.trace_memory:
+        tracemalloc.start()
+    wall_start, cpu_start = time.perf_counter(), time.process_time()
+    try:
+        if profile:
+            profile.enable()
+        mod_main()
+        result = ModuleResult(name, _STATUS_PASS)
+    except Exception:
+        result = ModuleResult(name, _STATUS_FAIL, _PHASE_RUN, traceback.format_exc())
+    finally:
+        if profile:
+            profile.disable()
+    result.wall_time = time.perf_counter() - wall_start
+    result.cpu_time = time.process_time() - cpu_start
+    if options.trace_memory:
+        result.peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    if profile and options.profile_dir:
+        profile.dump_stats(os.path.join(options.profile_dir, f"{name}.pstats"))
+
+    # Benchmark samples are taken without tracemalloc, which adds overhead
+    if result.status == _STATUS_PASS and options.bench:
         try:
-            mod_main()
-            print(style_text(" [PASS]", _STYLE_SUCCESS))
-            stats["passed"] += 1
+            for _ in range(options.warmup):
+                mod_main()
+            for _ in range(options.bench):
+                sample_start = time.perf_counter()
+                mod_main()
+                result.samples.append(time.perf_counter() - sample_start)
         except Exception:
+            result.status, result.error = _STATUS_FAIL, traceback.format_exc()
+    return result
+
+
+def run_with_coverage(name: str, options: RunOptions) -> ModuleResult:
+    """Run a module under coverage and attach the project lines it executed.
+
+    Coverage starts before the import, so module-level code counts too.
+    A change to a constant or a class body can break a lesson just as
+    well as a change inside main().
+    """
+    from coverage import Coverage
+
+    tracer = Coverage(data_file=None, config_file=False, include=[os.path.join(root_path[0], "*")])
+    tracer.set_option("run:disable_warnings", ["no-data-collected"])
+    tracer.start()
+    try:
+        result = run_module(name, options)
+    finally:
+        tracer.stop()
+    data = tracer.get_data()
+    for path in data.measured_files():
+        result.covered[relative_posix(path)] = sorted(data.lines(path) or [])
+    return result
+
+
+def relative_posix(path: str) -> str:
+    """Get a path relative to the project root, with forward slashes like git uses."""
+    return os.path.relpath(path, _ROOT_DIR).replace(os.sep, "/")
+
+
+def git(*args: str) -> str:
+    """Run a git command in the project root and return its output."""
+    import subprocess
+
+    return subprocess.run(["git", *args], cwd=_ROOT_DIR, capture_output=True, text=True, check=True).stdout
+
+
+def changed_lines(ref: str) -> tuple[dict[str, set[int]], dict[str, set[int]]]:
+    """Get the lines that changed in each file since a git ref, and where lines were inserted.
+
+    Line numbers refer to the file as it was at the ref, which is how the
+    impact map numbers them. A pure insertion changes no existing line, so
+    it is returned as the line it follows instead (0 for the top of a file).
+    Every changed file has an entry in the first mapping, even if it only
+    gained lines.
+    """
+    changes: dict[str, set[int]] = {}
+    insertions: dict[str, set[int]] = {}
+    path = None
+    for line in git("diff", "--unified=0", "--no-color", "--no-prefix", ref).splitlines():
+        if line.startswith("--- "):
+            path = None if line == "--- /dev/null" else line[4:]
+        elif line.startswith("+++ ") and path is None:
+            path = line[4:]
+        elif line.startswith("@@") and path:
+            start, _, count = line.split()[1].removeprefix("-").partition(",")
+            first, length = int(start), int(count or 1)
+            changes.setdefault(path, set()).update(range(first, first + length))
+            if not length:
+                insertions.setdefault(path, set()).add(first)
+    return changes, insertions
+
+
+def insertion_scopes(ref: str, path: str, points: set[int]) -> list[set[int] | None]:
+    """Get the function body that each insertion point of a file falls in at a git ref.
+
+    Code inserted into a function only runs when a line of its body does.
+    Anywhere else, such as module level or a class body, it runs whenever
+    the file is imported, which is returned as None.
+    """
+    import ast
+    import subprocess
+
+    try:
+        tree = ast.parse(git("show", f"{ref}:{path}"), path)
+    except (subprocess.CalledProcessError, SyntaxError):
+        return [None]
+    bodies = [
+        range(node.body[0].lineno, node.end_lineno + 1)
+        for node in ast.walk(tree)
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)) and node.end_lineno is not None
+    ]
+
+    scopes: list[set[int] | None] = []
+    for point in points:
+        # Lines inserted after the last line of a function may as well be
+        # dedented to module level, so only insertions before it count as inside
+        enclosing = [body for body in bodies if body.start - 1 <= point < body.stop - 1]
+        innermost = max(enclosing, key=lambda body: body.start, default=None)
+        scopes.append(set(innermost) if innermost is not None else None)
+    return scopes
+
+
+def impacted_modules(names: list[str], ref: str) -> list[str]:
+    """Get the modules whose recorded lines intersect the changes since a git ref.
+
+    Lines inserted into a function affect the modules that ran its body, and
+    lines inserted anywhere else affect every module that ran the file.
+    Modules without recorded lines always run, and so does everything when
+    the runner itself changed. Package __init__ files only execute in the
+    first lesson a worker imports from them, so any change to one counts
+    for every module below it.
+    """
+    impact = load_state(_IMPACT_FILE)
+    if not impact:
+        print(f"{_RUNNER_PROGRESS} No impact map found, run with --record-impact first. Running every module.")
+        return names
+    if impact["commit"] != git("rev-parse", ref).strip():
+        print(f"{_RUNNER_PROGRESS} Impact map was recorded at {impact['commit'][:12]}, so line numbers may have shifted since {ref}")
+
+    changes, insertions = changed_lines(ref)
+    if relative_posix(__file__) in changes:
+        return names
+    recorded = {path for lines in impact["modules"].values() for path in lines}
+    scopes = {path: insertion_scopes(ref, path, points) for path, points in insertions.items() if path in recorded}
+
+    def affected(name: str) -> bool:
+        if name not in impact["modules"]:
+            return True
+        packages = {module_path(package) for package in dependencies(name, build_import_graph([name])) if package != name}
+        if any(path and relative_posix(path) in changes for path in packages):
+            return True
+        for path, lines in impact["modules"][name].items():
+            if changes.get(path, set()).intersection(lines):
+                return True
+            if any(scope is None or scope.intersection(lines) for scope in scopes.get(path, [])):
+                return True
+        return False
+
+    return [name for name in names if affected(name)]
+
+
+def run_serial(names: list[str], options: RunOptions, on_start: Callable[[str], None] | None = None) -> Iterator[ModuleResult]:
+    """Run modules one after another in this process."""
+    for name in names:
+        if on_start:
+            on_start(name)
+        yield run_module(name, options)
+
+
+def dispatch(
+    executor: "Executor", names: list[str], jobs: int, options: RunOptions, on_start: Callable[[str], None] | None = None
+) -> Iterator[tuple[str, "Future[ModuleResult]"]]:
+    """Submit modules to a pool at most `jobs` at a time, yielding each one as it finishes.
+
+    A module is only submitted once a worker is free for it, so `on_start`
+    fires when the module starts running rather than when it is queued.
+    """
+    from concurrent.futures import FIRST_COMPLETED, wait
+
+    pending = list(reversed(names))
+    running: dict[Future[ModuleResult], str] = {}
+    while pending or running:
+        while pending and len(running) < jobs:
+            name = pending.pop()
+            if on_start:
+                on_start(name)
+            running[executor.submit(run_module, name, options)] = name
+        done, _ = wait(running, return_when=FIRST_COMPLETED)
+        for future in done:
+            yield running.pop(future), future
+
+
+def run_parallel(names: list[str], jobs: int, options: RunOptions, on_start: Callable[[str], None] | None = None) -> Iterator[ModuleResult]:
+    """Run modules across a process pool, yielding results as they finish."""
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        for _, future in dispatch(executor, names, jobs, options, on_start):
+            yield future.result()
+
+
+def run_interpreters(names: list[str], jobs: int, options: RunOptions, on_start: Callable[[str], None] | None = None) -> Iterator[ModuleResult]:
+    """Run modules across a pool of subinterpreters, yielding results as they finish.
+
+    Every subinterpreter has its own GIL and its own copy of each module,
+    so lessons run in parallel without leaking module-level state into
+    the runner. Modules that cannot run in a subinterpreter, or every
+    module when subinterpreters are unavailable, fall back to processes.
+    """
+    try:
+        from concurrent.futures import InterpreterPoolExecutor
+    except ImportError:
+        print(f"{_RUNNER_PROGRESS} Subinterpreters are unavailable, falling back to processes")
+        yield from run_parallel(names, jobs, options, on_start)
+        return
+
+    # tracemalloc hooks the allocator of the whole process, so concurrent
+    # interpreters would start, stop and read each other's traces
+    if options.trace_memory:
+        print(f"{_RUNNER_PROGRESS} Peak memory is not measured in subinterpreters")
+
+    # Import errors propagate instead of becoming FAIL results, since extension
+    # modules without subinterpreter support raise ImportError when loaded here
+    unsupported = []
+    interpreter_options = replace(options, trace_memory=False, raise_import_errors=True)
+    with InterpreterPoolExecutor(max_workers=jobs) as executor:
+        for name, future in dispatch(executor, names, jobs, interpreter_options, on_start):
+            try:
+                yield future.result()
+            except Exception:
+                # Lesson errors are caught by run_module, so this is an import error or the interpreter itself failing.
+                # A process reports genuine import errors as usual
+                unsupported.append(name)
+
+    if unsupported:
+        print(f"{_RUNNER_PROGRESS} Falling back to processes for {len(unsupported)} module(s) that failed in a subinterpreter")
+        yield from run_parallel(unsupported, jobs, options)
+
+
+def parse_import_times(output: str) -> dict[str, tuple[int, int]]:
+    """Parse `-X importtime` output into self and cumulative microseconds."""
+    times = {}
+    for line in output.splitlines():
+        if not line.startswith(_IMPORT_TIME_PREFIX):
+            continue
+        self_us, cumulative_us, package = line.removeprefix(_IMPORT_TIME_PREFIX).split("|")
+        if not self_us.strip().isdigit():
+            continue  # Header row
+        times[package.strip()] = (int(self_us), int(cumulative_us))
+    return times
+
+
+def import_times(name: str | None) -> tuple[int, dict[str, tuple[int, int]]]:
+    """Get the exit code and import times of a module in a fresh interpreter.
+
+    A module that raises while importing still gets its line in the output,
+    so only the exit code tells whether the import succeeded.
+    """
+    # Lesson names can be keywords like `async`, so avoid the import statement
+    import subprocess
+
+    code = f"__import__({name!r})" if name else "pass"
+    process = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=_ROOT_DIR, capture_output=True, text=True)
+    return process.returncode, parse_import_times(process.stderr)
+
+
+def profile_imports(names: list[str], jobs: int) -> None:
+    """Print the import cost of each module and its most expensive imports.
+
+    Each module is imported by a fresh interpreter, so every lesson pays
+    for its own imports instead of reusing what an earlier lesson loaded.
+    Anything the interpreter imports at startup is left out.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    startup = import_times(None)[1].keys()
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        results = dict(zip(names, executor.map(import_times, names)))
+    profiles = {name: times for name, (_, times) in results.items()}
+
+    def cumulative(name: str) -> int:
+        return profiles[name].get(name, (0, 0))[1]
+
+    for name in sorted(names, key=cumulative, reverse=True):
+        # The imports of a failed module are whatever printing the traceback needed
+        if results[name][0] != 0:
+            print(f"{_RUNNER_PROGRESS} Import {name}", end="")
             print(style_text(" [FAIL]", _STYLE_FAILURE))
-            for line in traceback.format_exc().splitlines():
-                print(f"    {line}")
-            stats["failed"] += 1
+            continue
+        deps = [(package, times) for package, times in profiles[name].items() if package != name and package not in startup]
+        deps.sort(key=lambda dep: dep[1][0], reverse=True)
+        print(f"{_RUNNER_PROGRESS} Import {name}: {cumulative(name) / 1000:.2f} ms")
+        for package, (self_us, cumulative_us) in deps[:_IMPORT_TOP_COUNT]:
+            print(f"    {package:<40} self {self_us / 1000:>8.2f} ms | cumulative {cumulative_us / 1000:>8.2f} ms")
+
+
+def run_watched(name: str, options: RunOptions, timeout: float, conn: "Connection", dump_path: str) -> None:
+    """Run a module in a child process that exits once the timeout expires.
+
+    The faulthandler watchdog dumps the stack of every thread to a file
+    before exiting, so the parent can show where the module got stuck.
+    """
+    import faulthandler
+
+    with open(dump_path, "w", encoding="utf-8") as dump:
+        faulthandler.dump_traceback_later(timeout, exit=True, file=dump)
+        result = run_module(name, options)
+        faulthandler.cancel_dump_traceback_later()
+    conn.send(result)
+    conn.close()
+
+
+def run_isolated(names: list[str], jobs: int, options: RunOptions, timeout: float, on_start: Callable[[str], None] | None = None) -> Iterator[ModuleResult]:
+    """Run each module in its own killable process, at most `jobs` at a time."""
+    import tempfile
+    from multiprocessing import Pipe, Process
+    from multiprocessing.connection import wait
+
+    pending = list(reversed(names))
+    running: dict[Connection, tuple[str, Process, str, float]] = {}
+    with tempfile.TemporaryDirectory() as dump_dir:
+        while pending or running:
+            while pending and len(running) < jobs:
+                name = pending.pop()
+                receiver, sender = Pipe(duplex=False)
+                dump_path = os.path.join(dump_dir, f"{name}.txt")
+                process = Process(target=run_watched, args=(name, options, timeout, sender, dump_path), daemon=True)
+                if on_start:
+                    on_start(name)
+                process.start()
+                sender.close()
+                running[receiver] = (name, process, dump_path, time.monotonic())
+
+            # A receiver is ready once its module reports back or its process dies.
+            # Also wake up when the oldest module overstays the watchdog.
+            deadline = min(started for *_, started in running.values()) + timeout + _TIMEOUT_GRACE
+            ready = wait(list(running), timeout=max(deadline - time.monotonic(), 0))
+            for receiver, (name, process, dump_path, started) in list(running.items()):
+                overdue = time.monotonic() - started > timeout + _TIMEOUT_GRACE
+                if receiver not in ready and not overdue:
+                    continue
+                del running[receiver]
+                try:
+                    result = receiver.recv() if receiver.poll() else None
+                except EOFError:
+                    result = None
+                receiver.close()
+
+                if result is None:
+                    # The watchdog fired, or the process died before it could report back
+                    process.kill()
+                    process.join()
+                    with open(dump_path, encoding="utf-8") as dump:
+                        stacks = dump.read()
+                    elapsed = time.monotonic() - started
+                    if stacks or overdue:
+                        result = ModuleResult(name, _STATUS_TIMEOUT, error=stacks, wall_time=elapsed)
+                    else:
+                        result = ModuleResult(name, _STATUS_FAIL, error=f"Worker exited with code {process.exitcode}", wall_time=elapsed)
+                process.join()
+                yield result
+
 
-    # Summary report
+def report_result(result: ModuleResult) -> None:
+    """Print the outcome of a single module."""
+    if result.status == _STATUS_SKIP:
+        print(f"{_RUNNER_PROGRESS} Skip {result.name}: No valid {_RUNNER_MAIN}() function")
+        return
+
+    if result.phase == _PHASE_LOAD:
+        print(f"{_RUNNER_PROGRESS} Load {result.name}", end="")
+    else:
+        print(f"{_RUNNER_PROGRESS} Run {result.name}:{_RUNNER_MAIN}", end="")
+
+    if result.status == _STATUS_PASS:
+        print(style_text(" [PASS]", _STYLE_SUCCESS) + (" (cached)" if result.cached else ""))
+        return
+
+    print(style_text(f" [{result.status}]", _STYLE_FAILURE))
+    for line in result.error.splitlines():
+        print(f"    {line}")
+
+
+def print_summary(stats: dict[str, int]) -> None:
+    """Print how many modules ended up in each status."""
     print("\n" + "=" * 30)
     print(style_text(f"Finish {root_name} runner", _STYLE_SUCCESS))
-    print(f"Passed: {stats['passed']} | Failed: {stats['failed']} | Skipped: {stats['skipped']}")
+    print(f"Passed: {stats['passed']} | Failed: {stats['failed']} | Skipped: {stats['skipped']} | Timed out: {stats['timed_out']}")
     print("=" * 30)
 
-    if stats["failed"] > 0:
+
+def report_slowest(results: list[ModuleResult]) -> None:
+    """Print the modules that took the longest to run."""
+    ran = sorted((result for result in results if result.phase == _PHASE_RUN and not result.cached), key=lambda result: result.wall_time, reverse=True)
+    if not ran:
+        return
+    width = max(len(result.name) for result in ran[:_SLOWEST_COUNT])
+    print(style_text("Slowest modules"))
+    print(f"{'Module':<{width}} {'Wall (ms)':>10} {'CPU (ms)':>10} {'Peak (KiB)':>11}")
+    for result in ran[:_SLOWEST_COUNT]:
+        print(f"{result.name:<{width}} {result.wall_time * 1000:>10.2f} {result.cpu_time * 1000:>10.2f} {result.peak_memory / 1024:>11.1f}")
+
+
+def summarize_samples(samples: list[float]) -> dict[str, float]:
+    """Get the min, median, 95th percentile and coefficient of variation of samples."""
+    import statistics
+
+    mean = statistics.fmean(samples)
+    return {
+        "min": min(samples),
+        "median": statistics.median(samples),
+        "p95": statistics.quantiles(samples, n=20, method="inclusive")[-1] if len(samples) > 1 else samples[0],
+        "cv": statistics.stdev(samples) / mean if len(samples) > 1 and mean > 0 else 0.0,
+    }
+
+
+def load_bench(path: str) -> dict[str, dict[str, float]]:
+    """Load benchmark statistics saved by --bench-save."""
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_bench(path: str, bench_stats: dict[str, dict[str, float]]) -> None:
+    """Save benchmark statistics for later comparison."""
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(bench_stats, f, indent=2, sort_keys=True)
+
+
+def report_bench(bench_stats: dict[str, dict[str, float]], baseline: dict[str, dict[str, float]], threshold: float) -> list[str]:
+    """Print benchmark statistics and return the modules that regressed.
+
+    A module regresses when its median is more than `threshold` slower
+    than the median recorded in the baseline.
+    """
+    if not bench_stats:
+        return []
+    regressions = []
+    width = max(len(name) for name in bench_stats)
+    print(style_text("Benchmarks"))
+    print(f"{'Module':<{width}} {'Min (ms)':>10} {'Median (ms)':>12} {'P95 (ms)':>10} {'CV':>7} {'Baseline':>9}")
+    for name, current in sorted(bench_stats.items()):
+        change = f"{'':>9}"
+        if name in baseline and baseline[name]["median"] > 0:
+            ratio = current["median"] / baseline[name]["median"] - 1
+            change = f"{ratio:>+9.1%}"
+            if ratio > threshold:
+                regressions.append(name)
+                change = style_text(change, _STYLE_FAILURE)
+        print(f"{name:<{width}} {current['min'] * 1000:>10.3f} {current['median'] * 1000:>12.3f} {current['p95'] * 1000:>10.3f} {current['cv']:>7.1%} {change}")
+    if regressions:
+        print(style_text(f"Regressed beyond {threshold:.0%}: {', '.join(regressions)}", _STYLE_FAILURE))
+    return regressions
+
+
+def write_json_report(path: str, results: list[ModuleResult], stats: dict[str, int]) -> None:
+    """Write the summary and per-module measurements as JSON."""
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"summary": stats, "modules": [asdict(result) for result in results]}, f, indent=2)
+
+
+def collapse_stacks(stats: "pstats.Stats") -> list[str]:
+    """Convert profile stats into collapsed stacks for flame graph tools.
+
+    cProfile only records caller/callee pairs, not full stacks, so the
+    stacks are rebuilt by walking down from every root function. Each
+    call edge gets a share of the time that matches its share of the
+    callee's cumulative time. Recursive edges stop the walk.
+    """
+    entries = stats.stats  # type: ignore[attr-defined]
+    callees: dict[tuple, dict[tuple, float]] = {func: {} for func in entries}
+    for func, (*_, callers) in entries.items():
+        for caller, (*_, edge_time) in callers.items():
+            callees.setdefault(caller, {})[func] = edge_time
+
+    def label(func: tuple) -> str:
+        filename, line, funcname = func
+        return funcname if filename == "~" else f"{funcname} ({os.path.basename(filename)}:{line})"
+
+    lines = []
+
+    def walk(func: tuple, path: list[str], seen: set[tuple], inclusive: float) -> None:
+        _, _, self_time, cumulative_time, _ = entries[func]
+        # Dropping sub-microsecond branches keeps the walk from visiting every path of a large call graph
+        if cumulative_time <= 0 or inclusive < 1e-6:
+            return
+        path = [*path, label(func)]
+        lines.append(f"{';'.join(path)} {round(inclusive * self_time / cumulative_time * 1_000_000)}")
+        for callee, edge_time in callees.get(func, {}).items():
+            if callee not in seen and callee in entries:
+                walk(callee, path, seen | {callee}, inclusive * edge_time / cumulative_time)
+
+    for func, (*_, cumulative_time, callers) in entries.items():
+        if not callers:
+            walk(func, [], {func}, cumulative_time)
+    return [line for line in lines if not line.endswith(" 0")]
+
+
+def write_profiles(profile_dir: str, results: list[ModuleResult]) -> None:
+    """Merge the profiles of this run and write them as pstats and collapsed stacks."""
+    import pstats
+
+    paths = [os.path.join(profile_dir, f"{result.name}.pstats") for result in results if not result.cached]
+    paths = [path for path in paths if os.path.exists(path)]
+    if not paths:
+        return
+    merged = pstats.Stats(*paths)
+    merged.dump_stats(os.path.join(profile_dir, _PROFILE_MERGED))
+    with open(os.path.join(profile_dir, _PROFILE_COLLAPSED), "w", encoding="utf-8") as f:
+        f.writelines(f"{line}\n" for line in collapse_stacks(merged))
+    print(f"Profiles for {len(paths)} module(s) written to {profile_dir} ({_PROFILE_MERGED}, {_PROFILE_COLLAPSED})")
+
+
+def load_reports(paths: list[str]) -> tuple[list[ModuleResult], list[str], list[str]]:
+    """Combine the module results of several JSON reports, such as one per shard.
+
+    Also returns the modules that appear more than once, which means the
+    reports came from overlapping shards, and the reports that could not
+    be read.
+    """
+    merged = {}
+    duplicates = []
+    unreadable = []
+    for path in paths:
+        try:
+            with open(path, encoding="utf-8") as f:
+                results = [ModuleResult(**module) for module in json.load(f)["modules"]]
+        except OSError as error:
+            unreadable.append(f"{path} ({error.strerror})")
+            continue
+        except (ValueError, KeyError, TypeError) as error:
+            unreadable.append(f"{path} (not a JSON report: {error})")
+            continue
+        for result in results:
+            if result.name in merged:
+                duplicates.append(result.name)
+            merged[result.name] = result
+    return [merged[name] for name in sorted(merged)], sorted(set(duplicates)), unreadable
+
+
+def write_junit_report(path: str, results: list[ModuleResult], stats: dict[str, int]) -> None:
+    """Write results as JUnit XML, with one test case per module.
+
+    Assertion failures in main() become <failure> elements, while import
+    errors and timeouts become <error> elements.
+    """
+    from xml.etree import ElementTree
+
+    suites = ElementTree.Element("testsuites")
+    suite = ElementTree.SubElement(
+        suites,
+        "testsuite",
+        name=root_name,
+        tests=str(len(results)),
+        failures=str(sum(result.status == _STATUS_FAIL and result.phase == _PHASE_RUN for result in results)),
+        errors=str(sum(result.status == _STATUS_FAIL and result.phase == _PHASE_LOAD for result in results) + stats["timed_out"]),
+        skipped=str(stats["skipped"]),
+        time=f"{sum(result.wall_time for result in results):.6f}",
+    )
+    for result in results:
+        classname, _, name = result.name.rpartition(".")
+        case = ElementTree.SubElement(suite, "testcase", classname=classname, name=name, time=f"{result.wall_time:.6f}")
+        message = result.error.strip().rpartition("\n")[2]
+        if result.status == _STATUS_SKIP:
+            ElementTree.SubElement(case, "skipped", message=f"No valid {_RUNNER_MAIN}() function")
+        elif result.status == _STATUS_TIMEOUT:
+            ElementTree.SubElement(case, "error", message="Timed out", type=_STATUS_TIMEOUT).text = result.error
+        elif result.status == _STATUS_FAIL:
+            tag = "error" if result.phase == _PHASE_LOAD else "failure"
+            ElementTree.SubElement(case, tag, message=message, type=message.partition(":")[0]).text = result.error
+    tree = ElementTree.ElementTree(suites)
+    ElementTree.indent(tree)
+    tree.write(path, encoding="utf-8", xml_declaration=True)
+
+
+def emit_event(events: TextIO | None, event: str, **fields: object) -> None:
+    """Append one JSON event to the stream and flush it for live consumers."""
+    if events is None:
+        return
+    events.write(json.dumps({"event": event, "time": time.time(), **fields}) + "\n")
+    events.flush()
+
+
+def source_mtimes() -> dict[str, int]:
+    """Get the modification time of every source file in the project."""
+    mtimes = {}
+    for dirpath, dirnames, filenames in os.walk(root_path[0]):
+        dirnames[:] = [dirname for dirname in dirnames if dirname != "__pycache__"]
+        for filename in filenames:
+            if filename.endswith(".py"):
+                path = os.path.join(dirpath, filename)
+                mtimes[path] = os.stat(path).st_mtime_ns
+    return mtimes
+
+
+def watch(filter_str: str | None) -> None:
+    """Poll the source tree and re-run the modules affected by each change.
+
+    Everything runs in this process. Changed modules and the modules that
+    import them are dropped from sys.modules, so the next run imports
+    their new source while every other module stays loaded.
+    """
+    mtimes = source_mtimes()
+    names = discover_modules(filter_str)
+    try:
+        while True:
+            stats = dict.fromkeys(_STAT_KEYS.values(), 0)
+            for result in run_serial(names, RunOptions()):
+                report_result(result)
+                stats[_STAT_KEYS[result.status]] += 1
+            print_summary(stats)
+            print(f"Watching {root_name} for changes (Ctrl+C to stop)")
+
+            names = []
+            while not names:
+                time.sleep(_WATCH_INTERVAL)
+                current = source_mtimes()
+                changed_paths = current.keys() ^ mtimes.keys() | {path for path in current.keys() & mtimes.keys() if current[path] != mtimes[path]}
+                mtimes = current
+                if not changed_paths:
+                    continue
+
+                changed = {path_to_module(path) for path in changed_paths}
+                candidates = discover_modules(filter_str)
+                graph = build_import_graph(candidates)
+                for stale in [name for name in graph if dependencies(name, graph) & changed]:
+                    sys.modules.pop(stale, None)
+                invalidate_caches()
+                names = [name for name in candidates if dependencies(name, graph) & changed]
+                print(f"\n{_RUNNER_PROGRESS} Changed {', '.join(sorted(changed))}")
+    except KeyboardInterrupt:
+        print(style_text(f"\nStop watching {root_name}"))
+
+
+def execute(names: list[str], args: Namespace, jobs: int, events: TextIO | None) -> tuple[list[ModuleResult], dict[str, int]]:
+    """Run modules with the executor selected by the arguments and report each result."""
+    stats = dict.fromkeys(_STAT_KEYS.values(), 0)
+    results = []
+
+    def record(result: ModuleResult) -> None:
+        report_result(result)
+        emit_event(
+            events,
+            "module_end",
+            module=result.name,
+            status=result.status,
+            phase=result.phase,
+            duration=result.wall_time,
+            cached=result.cached,
+            traceback=result.error,
+        )
+        stats[_STAT_KEYS[result.status]] += 1
+        results.append(result)
+
+    def on_start(name: str) -> None:
+        emit_event(events, "module_start", module=name)
+
+    # Reuse the last PASS of every module whose source has not changed since.
+    # Benchmarks, profiles and impact recording need fresh runs, so they ignore cached results.
+    options = RunOptions(args.bench, args.bench_warmup, profile_dir=args.profile_dir if args.profile else None, record_lines=args.record_impact)
+    result_cache = {} if args.no_cache or args.bench or args.profile or args.record_impact else load_state(_CACHE_FILE)
+    graph = build_import_graph(names)
+    fingerprints = {name: source_fingerprint(name, graph) for name in names}
+    pending = []
+    for name in names:
+        entry = result_cache.get(name)
+        if entry and entry["fingerprint"] == fingerprints[name]:
+            on_start(name)
+            record(ModuleResult(**{**entry["result"], "cached": True}))
+        else:
+            pending.append(name)
+
+    history = load_state(_HISTORY_FILE)
+    pending = schedule(pending, history)
+
+    # Only processes can be killed, so timeouts take priority over the backend choice
+    if args.timeout and args.backend == "interpreter":
+        print(f"{_RUNNER_PROGRESS} Subinterpreters cannot be killed, so --timeout runs modules in processes")
+    if args.timeout:
+        executed = run_isolated(pending, jobs, options, args.timeout, on_start)
+    elif args.backend == "interpreter":
+        executed = run_interpreters(pending, jobs, options, on_start)
+    elif jobs > 1:
+        executed = run_parallel(pending, jobs, options, on_start)
+    else:
+        executed = run_serial(pending, options, on_start)
+
+    impact = load_state(_IMPACT_FILE).get("modules", {}) if options.record_lines else {}
+    for result in executed:
+        if options.record_lines:
+            impact[result.name], result.covered = result.covered, {}
+        record(result)
+        if result.status == _STATUS_PASS:
+            result_cache[result.name] = {"fingerprint": fingerprints[result.name], "result": asdict(result)}
+        else:
+            result_cache.pop(result.name, None)
+    save_state(_CACHE_FILE, result_cache)
+    update_history(history, results)
+    save_state(_HISTORY_FILE, history)
+    if options.record_lines:
+        save_state(_IMPACT_FILE, {"commit": git("rev-parse", "HEAD").strip(), "modules": impact})
+    return results, stats
+
+
+def main() -> None:
+    args = parse_args(sys.argv[1:])
+    jobs = args.jobs if args.jobs > 0 else os.process_cpu_count() or 1
+
+    print(style_text(f"Start {root_name} runner"))
+
+    if args.report:
+        os.makedirs(args.report_dir, exist_ok=True)
+    report_paths = {fmt: os.path.join(args.report_dir, f"{_REPORT_NAME}.{ext}") for fmt, ext in _REPORT_EXTENSIONS.items()}
+
+    names = discover_modules(args.filter)
+    if args.changed_since:
+        impacted = impacted_modules(names, args.changed_since)
+        print(f"{_RUNNER_PROGRESS} {len(impacted)} of {len(names)} module(s) affected by changes since {args.changed_since}")
+        names = impacted
+
+    if args.merge:
+        results, duplicates, unreadable = load_reports(args.merge)
+        stats = dict.fromkeys(_STAT_KEYS.values(), 0)
+        for result in results:
+            stats[_STAT_KEYS[result.status]] += 1
+            if result.status not in (_STATUS_PASS, _STATUS_SKIP):
+                report_result(result)
+        print_summary(stats)
+
+        # The shards must cover every discovered module exactly once
+        reported = {result.name for result in results}
+        mismatches = {
+            "Unreadable reports": unreadable,
+            "Missing from the reports": sorted(set(names) - reported),
+            "Not discovered in this checkout": sorted(reported - set(names)),
+            "Reported by more than one shard": duplicates,
+        }
+        for problem, modules in mismatches.items():
+            if modules:
+                print(style_text(f"{problem}: {', '.join(modules)}", _STYLE_FAILURE))
+
+        if "json" in args.report:
+            write_json_report(report_paths["json"], results, stats)
+        if "junit" in args.report:
+            write_junit_report(report_paths["junit"], results, stats)
+        sys.exit(1 if stats["failed"] > 0 or stats["timed_out"] > 0 or any(mismatches.values()) else 0)
+
+    if args.shard:
+        if args.durations and "json" in args.report and os.path.abspath(args.durations) == os.path.abspath(report_paths["json"]):
+            sys.exit("--durations must not be the report this shard writes, or the split would change between runs")
+        names = shard_modules(names, args.shard, load_durations(args.durations))
+    if args.profile_imports:
+        profile_imports(names, jobs)
+        return
+    if args.watch:
+        watch(args.filter)
+        return
+
+    if args.profile:
+        os.makedirs(args.profile_dir, exist_ok=True)
+
+    with open(report_paths["ndjson"], "w", encoding="utf-8") if "ndjson" in args.report else nullcontext() as events:
+        emit_event(events, "run_start", modules=len(names))
+        results, stats = execute(names, args, jobs, events)
+        emit_event(events, "run_end", summary=stats)
+
+    print_summary(stats)
+    report_slowest(results)
+    if args.profile:
+        write_profiles(args.profile_dir, results)
+
+    if "json" in args.report:
+        write_json_report(report_paths["json"], results, stats)
+    if "junit" in args.report:
+        write_junit_report(report_paths["junit"], results, stats)
+
+    regressions = []
+    if args.bench:
+        bench_stats = {result.name: summarize_samples(result.samples) for result in results if result.samples}
+        baseline = load_bench(args.bench_baseline) if args.bench_baseline else {}
+        regressions = report_bench(bench_stats, baseline, args.bench_threshold)
+        if args.bench_save:
+            save_bench(args.bench_save, bench_stats)
+
+    if stats["failed"] > 0 or stats["timed_out"] > 0 or regressions:
         sys.exit(1)
 
 
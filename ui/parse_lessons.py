@@ -1,6 +1,17 @@
+import argparse
 import ast
+import builtins
+import hashlib
+import io
+import itertools
 import json
+import keyword
 import os
+import re
+import sys
+import tokenize
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 
 CATEGORY_MAP = {
     "fundamentals": "Fundamentals",
@@ -33,16 +44,173 @@ LESSON_ANNOTATIONS = {
 }
 
 
+# Only these token kinds get a color on the lesson page, following what the
+# github-dark theme colors in Python. Every other token (plain names and
+# punctuation) is rendered as plain text, so it doesn't need a span
+HIGHLIGHTED_TOKENS = {
+    "KEYWORD",
+    "OPERATOR",
+    "CONSTANT",
+    "DEFINITION",
+    "DECORATOR",
+    "CALL",
+    "BUILTIN",
+    "SELF",
+    "FIELD",
+    "STRING",
+    "NUMBER",
+    "COMMENT",
+}
+CONSTANT_KEYWORDS = {"True", "False", "None"}
+BUILTIN_NAMES = frozenset(name for name in dir(builtins) if not name.startswith("_"))
+PUNCTUATION = {"(", ")", "[", "]", "{", "}", ",", ":", ".", ";", "->", "..."}
+LINE_START_TOKENS = {tokenize.NEWLINE, tokenize.NL, tokenize.INDENT, tokenize.DEDENT}
+
+
+def utf16_len(text: str) -> int:
+    return len(text) if text.isascii() else len(text.encode("utf-16-le")) // 2
+
+
+def token_kind(token: tokenize.TokenInfo, previous: tokenize.TokenInfo | None, following: tokenize.TokenInfo | None, in_fstring: bool) -> str:
+    name = tokenize.tok_name[token.type]
+    if name.startswith(("FSTRING_", "TSTRING_")):
+        return "STRING"
+    if token.type == tokenize.OP:
+        if in_fstring and token.string in ("{", "}"):
+            return "FIELD"
+        if token.string == "@" and (previous is None or previous.type in LINE_START_TOKENS):
+            return "DECORATOR"
+        return "OP" if token.string in PUNCTUATION else "OPERATOR"
+    if token.type != tokenize.NAME:
+        return name
+    if token.string in CONSTANT_KEYWORDS:
+        return "CONSTANT"
+    if keyword.iskeyword(token.string):
+        return "KEYWORD"
+    if previous is not None and previous.string in ("def", "class"):
+        return "DEFINITION"
+    if token.string in ("self", "cls"):
+        return "SELF"
+    attribute = previous is not None and previous.string == "."
+    if token.string in BUILTIN_NAMES and not attribute:
+        return "BUILTIN"
+    if following is not None and following.string == "(":
+        return "CALL"
+    return name
+
+
+def source_tokens(content: str) -> list[tokenize.TokenInfo]:
+    # Tokenized once per lesson and shared by highlighting and search. Lessons
+    # using syntax newer than this interpreter get no tokens at all
+    try:
+        return list(tokenize.generate_tokens(io.StringIO(content).readline))
+    except (tokenize.TokenError, SyntaxError):
+        return []
+
+
+def tokenize_code(content: str, tokens: list[tokenize.TokenInfo]) -> dict:
+    # Spans are a flat list of (type, start, end) triples where type indexes into
+    # "types" and the offsets count UTF-16 code units, which is how JavaScript
+    # indexes the code string
+    lines = io.StringIO(content).readlines()
+    line_starts = [0]
+    for line in lines:
+        line_starts.append(line_starts[-1] + utf16_len(line))
+
+    def offset(row: int, col: int) -> int:
+        line = lines[row - 1] if row <= len(lines) else ""
+        return line_starts[row - 1] + utf16_len(line[:col])
+
+    types: list[str] = []
+    spans: list[int] = []
+    previous = None
+    fstring_depth = 0
+    decorating = False
+    for token, following in itertools.zip_longest(tokens, tokens[1:]):
+        name = token_kind(token, previous, following, fstring_depth > 0)
+        # The dotted name after a decorator's @ is part of the decorator
+        if decorating and (token.type == tokenize.NAME or token.string == "."):
+            name = "DECORATOR"
+        decorating = name == "DECORATOR"
+        if tokenize.tok_name[token.type].endswith("STRING_START"):
+            fstring_depth += 1
+        elif tokenize.tok_name[token.type].endswith("STRING_END"):
+            fstring_depth -= 1
+        previous = token
+        if name not in HIGHLIGHTED_TOKENS or token.start == token.end:
+            continue
+        if name not in types:
+            types.append(name)
+        spans.extend((types.index(name), offset(*token.start), offset(*token.end)))
+    return {"types": types, "spans": spans}
+
+
+def symbol_record(node: ast.FunctionDef | ast.AsyncFunctionDef | ast.ClassDef) -> dict:
+    return {
+        "name": node.name,
+        "lineno": node.lineno,
+        "end_lineno": node.end_lineno,
+        "docstring": (ast.get_docstring(node) or "").strip(),
+    }
+
+
+def symbol_table(tree: ast.Module | None) -> dict:
+    # Top-level definitions and imports with their line ranges, plus the methods
+    # of each class, so an outline can link straight to a line of the lesson
+    functions: list[dict] = []
+    classes: list[dict] = []
+    imports: list[dict] = []
+    for node in tree.body if tree is not None else []:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            functions.append(symbol_record(node))
+        elif isinstance(node, ast.ClassDef):
+            methods = [symbol_record(child) for child in node.body if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef))]
+            classes.append({**symbol_record(node), "methods": methods})
+        elif isinstance(node, ast.Import):
+            imports.extend({"module": alias.name, "names": [], "lineno": node.lineno} for alias in node.names)
+        elif isinstance(node, ast.ImportFrom):
+            module = "." * node.level + (node.module or "")
+            imports.append({"module": module, "names": [alias.name for alias in node.names], "lineno": node.lineno})
+    return {"functions": functions, "classes": classes, "imports": imports}
+
+
+SEARCH_STOP_WORDS = frozenset(
+    {"a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "in", "is", "it", "of", "on", "or", "that", "the", "this", "to", "with"}
+)
+
+
+def search_terms(name: str, docstring: str, tokens: list[tokenize.TokenInfo]) -> list[str]:
+    # Identifiers and comments come straight from the lesson's tokens, which
+    # already hold every name the AST would (definitions, attributes, arguments
+    # and imports) without walking the tree a second time
+    texts = {name, docstring}
+    for token in tokens:
+        if token.type == tokenize.COMMENT or (token.type == tokenize.NAME and not keyword.iskeyword(token.string)):
+            texts.add(token.string)
+
+    # Index snake_case identifiers both whole and by their parts, so that
+    # "fib_cached", "fib" and "cached" all find the benchmark lesson
+    terms: set[str] = set()
+    for text in texts:
+        for word in re.findall(r"\w+", text.lower()):
+            word = word.strip("_")
+            terms.update(part for part in [word, *word.split("_")] if len(part) > 1 and part not in SEARCH_STOP_WORDS)
+    return sorted(terms)
+
+
 def parse_file(filepath: str, relative_path: str) -> dict:
     with open(filepath, encoding="utf-8") as f:
         content = f.read()
 
+    tree: ast.Module | None
     try:
         tree = ast.parse(content)
         docstring = ast.get_docstring(tree) or ""
     except Exception:
+        tree = None
         docstring = ""
 
+    tokens = source_tokens(content)
     category = relative_path.split(os.sep)[0]
     filename = os.path.basename(filepath)
     name_without_ext = os.path.splitext(filename)[0]
@@ -57,6 +225,9 @@ def parse_file(filepath: str, relative_path: str) -> dict:
         "docstring": docstring.strip(),
         "code": content,
         "annotation": LESSON_ANNOTATIONS.get(name_without_ext),
+        "tokens": tokenize_code(content, tokens),
+        "symbols": symbol_table(tree),
+        "terms": search_terms(humanize_name(name_without_ext), docstring, tokens),
     }
 
 
@@ -119,12 +290,67 @@ LESSON_ORDER = {
 }
 
 
-def main():
-    root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-    target_dir = os.path.join(root_dir, "ultimatepython")
+def file_hash(filepath: str) -> str:
+    with open(filepath, "rb") as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
+
+
+def cache_version() -> str:
+    # The cache is only valid for the parser that wrote it, since edits to this
+    # script (e.g. LESSON_ANNOTATIONS) change the parsed output of every lesson,
+    # and for the interpreter running it, since tokenize differs between versions
+    return f"{file_hash(__file__)}:{sys.version_info.major}.{sys.version_info.minor}.{sys.version_info.micro}"
+
 
-    lessons = []
+def load_cache(cache_file: str) -> dict:
+    try:
+        with open(cache_file, encoding="utf-8") as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return cache.get("files", {}) if cache.get("version") == cache_version() else {}
+
+
+def save_cache(cache_file: str, files: dict) -> None:
+    os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+    write_if_changed(cache_file, json.dumps({"version": cache_version(), "files": files}, ensure_ascii=False, separators=(",", ":")))
+
+
+def write_if_changed(filepath: str, content: str) -> bool:
+    # Leave unchanged outputs alone so the Astro dev server does not rebuild pages for nothing
+    data = content.encode("utf-8")
+    try:
+        with open(filepath, "rb") as f:
+            if f.read() == data:
+                return False
+    except OSError:
+        pass
+    with open(filepath, "wb") as f:
+        f.write(data)
+    return True
+
+
+def cache_entry(filepath: str, relative_path: str, cache: dict, payload_dir: str) -> dict:
+    # Reuse the cached lesson when the file is untouched (same mtime and size) or
+    # when it was touched but its content hash is the same. The cache only keeps
+    # the lesson's index entry and search terms, since everything else lives in
+    # its payload file. The returned entry has no "index" key when the file has
+    # to be parsed again
+    stat = os.stat(filepath)
+    entry = cache.get(relative_path)
+    if entry and not os.path.exists(os.path.join(payload_dir, entry["index"]["payload"])):
+        entry = None
+    if entry and entry["mtime"] == stat.st_mtime_ns and entry["size"] == stat.st_size:
+        return entry
 
+    fresh_entry = {"mtime": stat.st_mtime_ns, "size": stat.st_size, "hash": file_hash(filepath)}
+    if entry and entry["hash"] == fresh_entry["hash"]:
+        fresh_entry.update(index=entry["index"], terms=entry["terms"])
+    return fresh_entry
+
+
+def collect_files(target_dir: str) -> list[tuple[str, str]]:
+    files = []
     for category in CATEGORY_ORDER:
         cat_dir = os.path.join(target_dir, category)
         if not os.path.exists(cat_dir):
@@ -140,26 +366,112 @@ def main():
             except ValueError:
                 return (1, name)
 
-        files = sorted(os.listdir(cat_dir), key=get_sort_key)
-        for filename in files:
+        for filename in sorted(os.listdir(cat_dir), key=get_sort_key):
             if filename.endswith(".py") and filename != "__init__.py":
-                filepath = os.path.join(cat_dir, filename)
-                rel_path = os.path.join(category, filename)
-                lesson = parse_file(filepath, rel_path)
-                lessons.append(lesson)
+                files.append((os.path.join(cat_dir, filename), os.path.join(category, filename)))
+    return files
+
+
+def parse_files(files: list[tuple[str, str]], jobs: int) -> list[dict]:
+    # Executor.map yields results in submission order, so the pool never changes
+    # the lesson order that collect_files decided on
+    if jobs == 1 or len(files) < 2:
+        return [parse_file(filepath, rel_path) for filepath, rel_path in files]
+    filepaths, rel_paths = zip(*files, strict=True)
+    with ProcessPoolExecutor(max_workers=min(jobs, len(files))) as executor:
+        return list(executor.map(parse_file, filepaths, rel_paths))
+
+
+def write_payload(payload_dir: str, lesson: dict) -> dict:
+    # The lesson's docstring and code go into their own file named after a hash
+    # of its bytes, so pages only load what they render and a file never changes
+    # under a given name. The returned index entry holds everything else
+    payload = json.dumps(
+        {"docstring": lesson["docstring"], "code": lesson["code"], "tokens": lesson["tokens"], "symbols": lesson["symbols"]},
+        ensure_ascii=False,
+        separators=(",", ":"),
+    )
+    digest = hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+    payload_file = f"{lesson['category']}.{lesson['id']}.{digest}.json"
+    write_if_changed(os.path.join(payload_dir, payload_file), payload)
+    return {
+        "name": lesson["name"],
+        "id": lesson["id"],
+        "path": lesson["path"],
+        "filename": lesson["filename"],
+        "category": lesson["category"],
+        "category_name": lesson["category_name"],
+        "summary": " ".join(lesson["docstring"].split("\n\n")[0].split()),
+        "annotation": lesson["annotation"],
+        "hash": digest,
+        "payload": payload_file,
+    }
+
+
+def remove_stale_payloads(payload_dir: str, index: list[dict]) -> None:
+    # Drop payloads left behind by lessons that changed or were removed
+    current = {entry["payload"] for entry in index}
+    for filename in os.listdir(payload_dir):
+        if filename.endswith(".json") and filename not in current:
+            os.remove(os.path.join(payload_dir, filename))
+
+
+def build_search_index(entries: list[dict]) -> dict:
+    # Terms are sorted so the client can find every term with a given prefix as
+    # one contiguous range by binary search. Postings hold positions in "paths"
+    # (the same order as lessons.json), delta-encoded so they stay small integers
+    postings = defaultdict(list)
+    for position, entry in enumerate(entries):
+        for term in entry["terms"]:
+            postings[term].append(position)
+
+    terms = sorted(postings)
+    return {
+        "paths": [entry["index"]["path"] for entry in entries],
+        "terms": terms,
+        "postings": [[b - a for a, b in itertools.pairwise([0, *postings[term]])] for term in terms],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate lesson data for the UI.")
+    parser.add_argument("-j", "--jobs", type=int, default=0, help="number of parser processes (0 means one per CPU)")
+    parser.add_argument("--no-cache", action="store_true", help="re-parse every lesson instead of only the changed ones")
+    args = parser.parse_args()
+    jobs = args.jobs if args.jobs > 0 else os.process_cpu_count() or 1
+
+    root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    target_dir = os.path.join(root_dir, "ultimatepython")
+    cache_file = os.path.join(root_dir, "ui", ".cache", "parse_lessons.json")
+    cache = {} if args.no_cache else load_cache(cache_file)
 
     output_dir = os.path.join(root_dir, "ui", "src", "data")
-    os.makedirs(output_dir, exist_ok=True)
+    payload_dir = os.path.join(output_dir, "lessons")
+    os.makedirs(payload_dir, exist_ok=True)
+
+    files = collect_files(target_dir)
+    entries = {rel_path: cache_entry(filepath, rel_path, cache, payload_dir) for filepath, rel_path in files}
+    stale = [(filepath, rel_path) for filepath, rel_path in files if "index" not in entries[rel_path]]
+    for (_, rel_path), lesson in zip(stale, parse_files(stale, jobs), strict=True):
+        entries[rel_path].update(index=write_payload(payload_dir, lesson), terms=lesson["terms"])
+    ordered = [entries[rel_path] for _, rel_path in files]
+    index = [entry["index"] for entry in ordered]
+    remove_stale_payloads(payload_dir, index)
 
     output_file = os.path.join(output_dir, "lessons.json")
-    with open(output_file, "w", encoding="utf-8") as f:
-        json.dump(lessons, f, indent=2, ensure_ascii=False)
+    written = write_if_changed(output_file, json.dumps(index, ensure_ascii=False, separators=(",", ":")))
 
     categories_file = os.path.join(output_dir, "categories.json")
-    with open(categories_file, "w", encoding="utf-8") as f:
-        json.dump(CATEGORY_ORDER, f, indent=2, ensure_ascii=False)
+    write_if_changed(categories_file, json.dumps(CATEGORY_ORDER, indent=2, ensure_ascii=False))
+
+    search_file = os.path.join(output_dir, "search.json")
+    write_if_changed(search_file, json.dumps(build_search_index(ordered), ensure_ascii=False, separators=(",", ":")))
+
+    if entries != cache:
+        save_cache(cache_file, entries)
 
-    print(f"Successfully parsed {len(lessons)} lessons and saved to {output_file}")
+    status = "saved to" if written else "unchanged in"
+    print(f"Successfully parsed {len(stale)} of {len(index)} lessons ({len(index) - len(stale)} cached), {status} {output_file}")
 
 
 if __name__ == "__main__":
@@ -5,11 +5,21 @@ Benchmarking is an approach that helps developers use profiling metrics
 and their code intuition to optimize programs further. This module uses
 cProfile to compare the performance of two functions with each other,
 showcasing the impact of caching/memoization with `functools.cache`.
+
+Profiles explain where time goes, but claims like "A is faster than B" need
+timings that hold up to noise. This module also builds a small statistical
+harness in the spirit of `timeit`: it calibrates a loop count, warms up,
+rejects outliers and bootstraps a confidence interval for the median.
 """
 
 import cProfile
-import io
+import os
 import pstats
+import random
+import statistics
+import time
+from collections.abc import Callable
+from dataclasses import dataclass
 from functools import cache
 
 
@@ -34,6 +44,192 @@ def fib_cached(n: int) -> int:
     return fib_cached(n - 1) + fib_cached(n - 2)
 
 
+def function_label(filename: str, lineno: int, name: str) -> str:
+    """Name a profiled function along with where it is defined."""
+    if filename == "~":  # Built-in functions have no source
+        return name
+    return f"{name} ({os.path.basename(filename)}:{lineno})"
+
+
+@dataclass(frozen=True)
+class FunctionStats:
+    """Profile statistics for one function.
+
+    Recursive calls count towards `calls` but not `primitive_calls`, and
+    `tottime` leaves out the time spent in the functions it calls while
+    `cumtime` includes it.
+    """
+
+    filename: str
+    lineno: int
+    name: str
+    calls: int
+    primitive_calls: int
+    tottime: float
+    cumtime: float
+
+    @property
+    def label(self) -> str:
+        """Name the function along with where it is defined."""
+        return function_label(self.filename, self.lineno, self.name)
+
+
+@dataclass(frozen=True)
+class CallEdge:
+    """Calls made from one function to another."""
+
+    caller: str
+    callee: str
+    calls: int
+
+
+def function_stats(stats: pstats.Stats) -> list[FunctionStats]:
+    """Read the profile statistics of every function as typed records.
+
+    The records are sorted by cumulative time, the same order that
+    `stats.sort_stats("cumulative")` prints them in, without formatting
+    and parsing the printed table.
+    """
+    records = [
+        FunctionStats(filename, lineno, name, calls, primitive_calls, tottime, cumtime)
+        for (filename, lineno, name), (primitive_calls, calls, tottime, cumtime, _) in stats.stats.items()  # type: ignore[attr-defined]
+    ]
+    return sorted(records, key=lambda record: record.cumtime, reverse=True)
+
+
+def diff_stats(before: list[FunctionStats], after: list[FunctionStats]) -> dict[str, FunctionStats]:
+    """Subtract the statistics of one profile from another, per function.
+
+    Functions missing from either profile count as never called there.
+    """
+    old = {record.label: record for record in before}
+    new = {record.label: record for record in after}
+    deltas = {}
+    for label in old.keys() | new.keys():
+        template = new.get(label) or old[label]
+        zero = FunctionStats(template.filename, template.lineno, template.name, 0, 0, 0.0, 0.0)
+        a, b = old.get(label, zero), new.get(label, zero)
+        deltas[label] = FunctionStats(
+            template.filename,
+            template.lineno,
+            template.name,
+            b.calls - a.calls,
+            b.primitive_calls - a.primitive_calls,
+            b.tottime - a.tottime,
+            b.cumtime - a.cumtime,
+        )
+    return deltas
+
+
+def call_graph(stats: pstats.Stats) -> list[CallEdge]:
+    """List who called whom, and how often, from the profile statistics."""
+    edges = []
+    for key, (*_, callers) in stats.stats.items():  # type: ignore[attr-defined]
+        for caller, caller_stats in callers.items():
+            # cProfile stores (calls, primitive calls, tottime, cumtime) per caller
+            calls = caller_stats[0] if isinstance(caller_stats, tuple) else caller_stats
+            edges.append(CallEdge(function_label(*caller), function_label(*key), calls))
+    return edges
+
+
+def export_dot(edges: list[CallEdge]) -> str:
+    """Export a call graph in the DOT language used by Graphviz."""
+    lines = ["digraph calls {"]
+    lines.extend(f'    "{edge.caller}" -> "{edge.callee}" [label="{edge.calls}"];' for edge in edges)
+    lines.append("}")
+    return "\n".join(lines)
+
+
+def time_loops(func: Callable[[], object], loops: int) -> float:
+    """Time how many seconds it takes to call a function in a loop."""
+    start = time.perf_counter()
+    for _ in range(loops):
+        func()
+    return time.perf_counter() - start
+
+
+def calibrate(func: Callable[[], object], target: float = 0.002) -> int:
+    """Find a loop count that runs for at least the target time.
+
+    This follows `timeit.Timer.autorange`, trying 1, 2, 5, 10, 20, 50, ...
+    loops so that timer resolution is small next to each sample.
+    """
+    loops = 1
+    while True:
+        for factor in (1, 2, 5):
+            if time_loops(func, loops * factor) >= target:
+                return loops * factor
+        loops *= 10
+
+
+def reject_outliers(samples: list[float]) -> list[float]:
+    """Drop samples outside Tukey's fences, 1.5 IQR beyond the quartiles.
+
+    Interrupts and cache misses only ever make a sample slower, so a few
+    samples land far above the rest and would skew the result.
+    """
+    q1, _, q3 = statistics.quantiles(samples, n=4)
+    spread = 1.5 * (q3 - q1)
+    return [sample for sample in samples if q1 - spread <= sample <= q3 + spread]
+
+
+def bootstrap_interval(samples: list[float], rng: random.Random, confidence: float = 0.95, resamples: int = 1000) -> tuple[float, float]:
+    """Estimate a confidence interval for the median by resampling the samples."""
+    medians = sorted(statistics.median(rng.choices(samples, k=len(samples))) for _ in range(resamples))
+    tail = (1 - confidence) / 2
+    return medians[int(tail * resamples)], medians[int((1 - tail) * resamples) - 1]
+
+
+@dataclass(frozen=True)
+class Measurement:
+    """Seconds per call of a function, with a confidence interval for the median."""
+
+    samples: tuple[float, ...]
+    loops: int
+    median: float
+    low: float
+    high: float
+
+
+@dataclass(frozen=True)
+class Comparison:
+    """Measurements of a baseline function and a candidate function."""
+
+    baseline: Measurement
+    candidate: Measurement
+
+    @property
+    def speedup(self) -> float:
+        """How many times faster the candidate is than the baseline."""
+        return self.baseline.median / self.candidate.median
+
+    @property
+    def significant(self) -> bool:
+        """Check that the confidence intervals do not overlap."""
+        return self.candidate.high < self.baseline.low or self.baseline.high < self.candidate.low
+
+    @property
+    def faster(self) -> bool:
+        """Check that the candidate is significantly faster than the baseline."""
+        return self.significant and self.candidate.median < self.baseline.median
+
+
+def measure(func: Callable[[], object], repeat: int = 15, warmup: int = 3, seed: int = 0) -> Measurement:
+    """Measure the seconds per call of a function."""
+    loops = calibrate(func)
+    # Warmup runs fill caches and let the interpreter specialize hot code
+    for _ in range(warmup):
+        time_loops(func, loops)
+    samples = reject_outliers([time_loops(func, loops) / loops for _ in range(repeat)])
+    low, high = bootstrap_interval(samples, random.Random(seed))
+    return Measurement(tuple(samples), loops, statistics.median(samples), low, high)
+
+
+def compare(baseline: Callable[[], object], candidate: Callable[[], object], **kwargs: int) -> Comparison:
+    """Measure two functions the same way so they can be compared."""
+    return Comparison(measure(baseline, **kwargs), measure(candidate, **kwargs))
+
+
 def main() -> None:
     # Create a profile instance
     profile = cProfile.Profile()
@@ -49,24 +245,52 @@ def main() -> None:
 
     profile.disable()
 
-    # Sort statistics by cumulative time spent for each function call.
-    # There are other ways to sort the stats by, but this is the most
-    # common way of doing so. For more info, please consult Python docs:
-    # https://docs.python.org/3/library/profile.html
-    buffer = io.StringIO()
-    ps = pstats.Stats(profile, stream=buffer).sort_stats("cumulative")
-
-    # print_stats writes the tabular profiling info to the buffer
-    ps.print_stats()
-    output = buffer.getvalue()
+    # Read the statistics as records sorted by cumulative time spent for each
+    # function call. `print_stats` would show the same numbers as a table,
+    # which is meant for people rather than code. For more info, please
+    # consult Python docs: https://docs.python.org/3/library/profile.html
+    ps = pstats.Stats(profile)
+    records = {record.name: record for record in function_stats(ps)}
 
     # Naive recursive fib(15) requires exactly 1,973 calls.
     # Cached recursive fib(15) requires exactly 16 calls (inputs 0 to 15).
-    naive_called = any("1973" in line and "fib_naive" in line for line in output.split("\n"))
-    cached_called = any("16" in line and "fib_cached" in line for line in output.split("\n"))
+    # Only the outermost call of each is primitive, the rest are recursive
+    assert records["fib_naive"].calls == 1973
+    assert records["fib_cached"].calls == 16
+    assert records["fib_naive"].primitive_calls == 1
+    assert records["fib_naive"].cumtime >= records["fib_naive"].tottime > 0
+
+    # The call graph shows the recursion as functions calling themselves
+    edges = call_graph(ps)
+    naive_label = records["fib_naive"].label
+    assert CallEdge(naive_label, naive_label, 1972) in edges
+    assert f'"{naive_label}" -> "{naive_label}" [label="1972"];' in export_dot(edges)
+
+    # Diffing profiles shows how a change affects each function. Going from
+    # fib(10) to fib(15) takes 1,796 more calls of the naive version
+    small_profile = cProfile.Profile()
+    small_profile.enable()
+    fib_naive(10)
+    small_profile.disable()
+    deltas = diff_stats(function_stats(pstats.Stats(small_profile)), function_stats(ps))
+    assert deltas[naive_label].calls == 1973 - 177
+    assert deltas[records["fib_cached"].label].calls == 16
+
+    # Profiling adds overhead to every call, so use the harness for timings.
+    # Timings change from run to run, so only check how each measurement is
+    # built: every sample covers at least one loop, and the median and its
+    # confidence interval fall within the samples
+    comparison = compare(lambda: fib_naive(15), lambda: fib_cached(15))
+    for measurement in (comparison.baseline, comparison.candidate):
+        assert measurement.loops >= 1
+        assert min(measurement.samples) <= measurement.low <= measurement.high <= max(measurement.samples)
+        assert min(measurement.samples) <= measurement.median <= max(measurement.samples)
+    assert isinstance(comparison.faster, bool)
 
-    assert naive_called is True
-    assert cached_called is True
+    # Once warm, the cached version is a dictionary lookup per call, so it
+    # usually comes out hundreds of times faster with a significant result.
+    # The bound here is kept very loose so that a busy machine cannot fail it
+    assert comparison.speedup > 1
 
 
 if __name__ == "__main__":